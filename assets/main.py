@@ -3,6 +3,8 @@
 Video conversion script to convert MOV to GIF and reduce duration to 1/2 with lower resolution
 """
 
+import json
+import shutil
 import subprocess
 import sys
 import os
@@ -11,49 +13,107 @@ from pathlib import Path
 
 def check_ffmpeg():
     """Check if FFmpeg is installed"""
+    return shutil.which('ffmpeg') is not None
+
+
+# Supported hardware decoders, mapped to the pixel format of the
+# frames they emit (None lets ffmpeg copy frames back to system memory itself)
+HWACCEL_OUTPUT_FORMATS = {
+    'videotoolbox': None,
+    'cuda': 'cuda',
+    'vaapi': 'vaapi',
+}
+
+# Device nodes that must exist before a Linux hardware decoder is worth probing
+HWACCEL_DEVICE_NODES = {
+    'cuda': '/dev/nvidiactl',
+    'vaapi': '/dev/dri/renderD128',
+}
+
+
+def detect_hwaccel():
+    """Pick a hardware decoder whose device FFmpeg can actually open, if any"""
+    if sys.platform == 'darwin':
+        candidates = ['videotoolbox']
+    else:
+        # Checking device nodes first means machines without a GPU never
+        # spawn an extra ffmpeg process
+        candidates = [accel for accel, node in HWACCEL_DEVICE_NODES.items() if os.path.exists(node)]
+    
+    for accel in candidates:
+        if hwaccel_device_available(accel):
+            return accel
+    return None
+
+
+def hwaccel_device_available(accel):
+    """Check that FFmpeg can open a device for the given hardware decoder"""
     try:
-        subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
+        subprocess.run([
+            'ffmpeg',
+            '-v', 'error',
+            '-init_hw_device', accel,
+            '-f', 'lavfi',
+            '-i', 'nullsrc',
+            '-frames', '1',
+            '-f', 'null',
+            '-'
+        ], capture_output=True, check=True)
         return True
     except (subprocess.CalledProcessError, FileNotFoundError):
         return False
 
 
-def get_video_duration(input_file):
-    """Get video duration in seconds"""
-    try:
-        result = subprocess.run([
-            'ffprobe', 
-            '-v', 'quiet',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            str(input_file)
-        ], capture_output=True, text=True, check=True)
-        
-        return float(result.stdout.strip())
-    except (subprocess.CalledProcessError, ValueError):
-        print("Warning: Could not determine video duration")
-        return None
+# FFmpeg error messages that only come from the hardware decoding path
+HWACCEL_ERROR_MARKERS = (
+    'hwaccel initialisation returned error',
+    'failed setup for format',
+    'device creation failed',
+    'no device available for decoder',
+    'failed to transfer data to output frame',
+    'error creating videotoolbox decoder',
+)
+
 
+def is_hwaccel_error(stderr):
+    """Tell whether an FFmpeg failure came from the hardware decoder"""
+    stderr = stderr.lower()
+    return any(marker in stderr for marker in HWACCEL_ERROR_MARKERS)
 
-def get_video_info(input_file):
-    """Get video resolution and other info"""
+
+def probe_video(input_file):
+    """Get video resolution and duration with a single ffprobe call"""
     try:
         result = subprocess.run([
             'ffprobe',
             '-v', 'quiet',
             '-select_streams', 'v:0',
-            '-show_entries', 'stream=width,height',
-            '-of', 'csv=p=0',
+            '-show_entries', 'stream=width,height:format=duration',
+            '-of', 'json',
             str(input_file)
         ], capture_output=True, text=True, check=True)
         
-        width, height = map(int, result.stdout.strip().split(','))
-        return width, height
+        info = json.loads(result.stdout)
     except (subprocess.CalledProcessError, ValueError):
-        return None, None
+        print("Warning: Could not probe video")
+        return None, None, None
+    
+    streams = info.get('streams') or [{}]
+    width = streams[0].get('width')
+    height = streams[0].get('height')
+    
+    try:
+        duration = float(info.get('format', {}).get('duration'))
+    except (TypeError, ValueError):
+        print("Warning: Could not determine video duration")
+        duration = None
+    
+    return width, height, duration
 
 
-def convert_video_to_gif(input_file, output_file, speed_factor=2.0, target_width=800, fps=15):
+def convert_video_to_gif(input_file, output_file, speed_factor=2.0, target_width=800, fps=15,
+                         hwaccel=None, start_time=None, duration=None, dither='bayer', palette_new=False,
+                         video_info=None):
     """
     Convert MOV to GIF, speed up by the given factor, and reduce resolution
     
@@ -63,10 +123,21 @@ def convert_video_to_gif(input_file, output_file, speed_factor=2.0, target_width
         speed_factor (float): Speed multiplication factor (2.0 = 2x faster = 1/2 duration)
         target_width (int): Target width for resolution scaling
         fps (int): Target frame rate for GIF
+        hwaccel (str): FFmpeg hardware decoder to use (detected automatically if None, '' to disable)
+        start_time (float): Seconds into the input to start from (None = beginning)
+        duration (float): Seconds of input to convert, before speed-up (None = until end)
+        dither (str): paletteuse dithering mode. 'bayer' (ordered) compresses best and is
+            cheapest to encode; error-diffusion modes such as 'sierra2_4a' look smoother
+            on gradients but produce noisier, larger GIFs
+        palette_new (bool): Generate a palette per frame (stats_mode=single + new=1).
+            Helps captures with frequent scene changes at the cost of a larger file
+        video_info (tuple): (width, height, duration) as returned by probe_video (probed if None)
     """
     
     # Get original video info
-    orig_width, orig_height = get_video_info(input_file)
+    if video_info is None:
+        video_info = probe_video(input_file)
+    orig_width, orig_height, _ = video_info
     
     # Calculate target height maintaining aspect ratio
     if orig_width and orig_height:
@@ -83,51 +154,92 @@ def convert_video_to_gif(input_file, output_file, speed_factor=2.0, target_width
         target_height = 600
         print(f"Could not detect original resolution, using default: {target_width}x{target_height}")
     
-    # Create high-quality GIF with palette optimization
-    # Step 1: Generate palette
-    palette_file = output_file.parent / 'palette.png'
-    
-    palette_cmd = [
-        'ffmpeg',
-        '-i', str(input_file),
-        '-vf', f'fps={fps},scale={target_width}:{target_height}:flags=lanczos,setpts={1/speed_factor}*PTS,palettegen=stats_mode=diff',
-        '-y',
-        str(palette_file)
-    ]
-    
-    # Step 2: Generate GIF using the palette
-    gif_cmd = [
-        'ffmpeg',
-        '-i', str(input_file),
-        '-i', str(palette_file),
-        '-lavfi', f'fps={fps},scale={target_width}:{target_height}:flags=lanczos,setpts={1/speed_factor}*PTS[x];[x][1:v]paletteuse=dither=bayer:bayer_scale=5:diff_mode=rectangle',
-        '-y',
-        str(output_file)
-    ]
+    # Palette generation and dithering options
+    stats_mode = 'single' if palette_new else 'diff'
+    paletteuse_opts = f'dither={dither}'
+    if dither == 'bayer':
+        paletteuse_opts += ':bayer_scale=5'
+    paletteuse_opts += ':diff_mode=rectangle'
+    if palette_new:
+        paletteuse_opts += ':new=1'
+    
+    # Let ffmpeg spread scaling and palette work across all cores
+    filter_threads = str(os.cpu_count() or 4)
+    
+    def build_gif_cmd(accel):
+        # Create high-quality GIF with palette optimization in a single pass:
+        # the decoded and scaled stream is split so palettegen and paletteuse
+        # share the same front-end instead of decoding the input twice
+        input_args = []
+        download = ''
+        # Seek and limit as input options so ffmpeg jumps to the nearest
+        # keyframe instead of decoding and discarding the skipped prefix,
+        # and so the duration is measured on the source timeline
+        if start_time is not None:
+            input_args += ['-ss', str(start_time)]
+        if duration is not None:
+            input_args += ['-t', str(duration)]
+        if accel:
+            input_args += ['-hwaccel', accel]
+            output_format = HWACCEL_OUTPUT_FORMATS.get(accel)
+            if output_format:
+                # Frames stay on the GPU, so bring them back for the CPU filters,
+                # after fps has dropped the ones the GIF does not keep
+                input_args += ['-hwaccel_output_format', output_format]
+                download = 'hwdownload,format=nv12,'
+        
+        filter_graph = (
+            f'[0:v:0]fps={fps},{download}scale={target_width}:{target_height}:flags=lanczos,setpts={1/speed_factor}*PTS,split[a][b];'
+            f'[a]palettegen=stats_mode={stats_mode}[p];'
+            f'[b][p]paletteuse={paletteuse_opts}[gif]'
+        )
+        
+        return [
+            'ffmpeg',
+            '-threads', '0',
+            '-filter_complex_threads', filter_threads,
+            '-loglevel', 'error',
+            *input_args,
+            '-i', str(input_file),
+            '-filter_complex', filter_graph,
+            # Only the first video stream is used; skip audio, subtitle and data streams
+            '-map', '[gif]',
+            '-an', '-sn', '-dn',
+            '-y',
+            str(output_file)
+        ]
+    
+    if hwaccel is None:
+        hwaccel = detect_hwaccel()
     
     print(f"Converting {input_file} to {output_file}...")
     print(f"Speed factor: {speed_factor}x (duration will be {1/speed_factor:.2%} of original)")
     print(f"Target FPS: {fps}")
+    print(f"Hardware decoding: {hwaccel or 'disabled'}")
     
     try:
-        # Step 1: Generate palette
-        print("Step 1: Generating color palette...")
-        subprocess.run(palette_cmd, check=True, capture_output=True)
-        
-        # Step 2: Generate GIF
-        print("Step 2: Converting to GIF...")
-        subprocess.run(gif_cmd, check=True, capture_output=False)
-        
-        # Clean up palette file
-        if palette_file.exists():
-            palette_file.unlink()
+        print("Converting to GIF...")
+        if hwaccel:
+            # Capture errors so hardware decoder failures can be told apart
+            result = subprocess.run(build_gif_cmd(hwaccel), stderr=subprocess.PIPE, text=True)
+            if result.returncode != 0:
+                if not is_hwaccel_error(result.stderr):
+                    print(result.stderr, end='', file=sys.stderr)
+                    raise subprocess.CalledProcessError(result.returncode, result.args)
+                # Device opened but cannot decode this input (codec, profile, driver issue)
+                print(f"Warning: {hwaccel} decoding failed, retrying with software decoding")
+                subprocess.run(build_gif_cmd(None), check=True, capture_output=False)
+        else:
+            subprocess.run(build_gif_cmd(None), check=True, capture_output=False)
         
         print(f"✅ Conversion completed successfully!")
         print(f"Output file: {output_file}")
         
         # Get file sizes for comparison
-        input_size = input_file.stat().st_size / (1024 * 1024)  # MB
-        output_size = output_file.stat().st_size / (1024 * 1024)  # MB
+        in_sz = input_file.stat().st_size
+        out_sz = output_file.stat().st_size
+        input_size = in_sz / (1024 * 1024)  # MB
+        output_size = out_sz / (1024 * 1024)  # MB
         
         print(f"Input file size: {input_size:.2f} MB")
         print(f"Output file size: {output_size:.2f} MB")
@@ -138,9 +250,6 @@ def convert_video_to_gif(input_file, output_file, speed_factor=2.0, target_width
         
     except subprocess.CalledProcessError as e:
         print(f"❌ Error during conversion: {e}")
-        # Clean up palette file if it exists
-        if palette_file.exists():
-            palette_file.unlink()
         return False
 
 
@@ -165,15 +274,17 @@ def main():
         print("  Windows: Download from https://ffmpeg.org/")
         sys.exit(1)
     
-    # Get original video duration
-    original_duration = get_video_duration(input_file)
+    # Get original video resolution and duration
+    video_info = probe_video(input_file)
+    original_duration = video_info[2]
     if original_duration:
         new_duration = original_duration / 2.0
         print(f"Original duration: {original_duration:.2f} seconds")
         print(f"New duration: {new_duration:.2f} seconds")
     
     # Perform conversion with 2x speed and GIF format
-    success = convert_video_to_gif(input_file, output_file, speed_factor=2.0, target_width=800, fps=15)
+    success = convert_video_to_gif(input_file, output_file, speed_factor=2.0, target_width=800, fps=15,
+                                   video_info=video_info)
     
     if success:
         print(f"🎉 Video conversion completed!")
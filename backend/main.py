@@ -1,6 +1,6 @@
 import os
 import asyncio
-import json
+import itertools
 import logging
 from typing import AsyncGenerator
 from contextlib import asynccontextmanager
@@ -9,10 +9,14 @@ from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from anthropic import Anthropic
+import anyio
+import orjson
+from anthropic import AsyncAnthropic
 from dotenv import load_dotenv
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
 
 # Logging configuration
 log_file_path = Path(__file__).parent / 'backend.log'
@@ -28,79 +32,235 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Number of MCP server processes. One session already runs tool calls
+# concurrently, and each server keeps its own search cache and arXiv
+# connections, so more servers mainly add isolation
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "1"))
+
+# Text deltas arriving within this many seconds are sent as one SSE event
+TEXT_BATCH_WINDOW = 0.02
+
+# Instructions sent to Claude for each term; {text} is the term to explain
+EXPLAIN_PROMPT_TEMPLATE = """You are a research term explainer. Your task is to explain the term: '{text}'
+
+Follow these steps in order:
+
+Step 1: Search for relevant papers
+- If you know landmark/seminal papers for this term, search by exact title
+- Search using the original term '{text}' as a keyword
+- Search using related technical terms, variations, or more specific keywords
+- Use multiple search queries to gather approximately 20-30 papers total
+- Use max_results parameter appropriately for each search
+
+Step 2: Filter papers based on abstracts
+- Read the abstract of each retrieved paper carefully
+- Select only papers that are directly relevant to explaining '{text}'
+- Exclude papers that only mention the term tangentially
+- Aim to select the top 10 most relevant papers (or fewer if less than 10 are truly relevant)
+- Prioritize: foundational papers, seminal works, survey papers, and highly-cited research
+
+Step 3: Write the explanation
+- Based on the abstracts and content of the selected papers, write a comprehensive explanation of '{text}'
+- Include: definition, key concepts, applications, and significance in the field
+- Reference specific papers when explaining concepts (e.g., "as introduced in [Paper Title]")
+- Use proper Markdown format with double line breaks between sections
+
+Step 4: Display the selected papers
+- At the end, show the 10 most relevant papers
+- IMPORTANT: Use the ACTUAL pdf_url from each paper result
+- Format each paper link like this example:
+  - [Attention is All You Need](https://arxiv.org/pdf/1706.03762) - Introduces the Transformer architecture
+- Replace the title and URL with the actual values from the search results
+- Do NOT use placeholder text like "(arXiv URL)" - use the real PDF URL returned in the search results
+
+## Related Papers
+
+[List the actual papers here with their real PDF URLs]
+
+Format requirements:
+- Use proper Markdown with clear line breaks
+- Use double line breaks between sections
+- Important: In the explanation text (Step 3), you must insert a newline character (\n) after every sentence (ending in '.').
+- Make the explanation evidence-based using the paper abstracts
+- **Always use the actual PDF URLs from the search results, never placeholder text**
+
+Important: Your explanation should be grounded in the actual content of the papers you found, not just general knowledge.
+"""
+
+def sse_event(event: dict) -> bytes:
+    """Encode an event as a Server-Sent Events frame"""
+    return b"data: " + orjson.dumps(event) + b"\n\n"
+
 class TextRequest(BaseModel):
     text: str
 
 class MCPClient:
     def __init__(self):
-        self.session = None
-        self.server_task = None
-        self.session_ready = None
-        self.anthropic_client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        # Live sessions; each can serve many concurrent requests over its pipe
+        self._sessions: list[ClientSession] = []
+        self._session_counter = itertools.count()
+        # Set whenever a session joins the pool, so callers can wait out a restart
+        self._session_added = asyncio.Event()
+        # Per-session events that keep each session open until it is stopped
+        self._session_stops: dict[ClientSession, asyncio.Event] = {}
+        # Parameters used to (re)start servers; None while the pool is stopped
+        self._server_params = None
+        self.server_tasks: list[asyncio.Task] = []
+        self._claude_tools = None
+        self.anthropic_client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
     async def start_mcp_server(self):
-        """Start MCP server and initialize session"""
-        logger.info("Starting MCP server...")
-        
-        # Event to notify session initialization completion
-        self.session_ready = asyncio.Event()
+        """Start a pool of MCP servers and initialize a session with each"""
+        logger.info("Starting %d MCP server(s)...", MCP_POOL_SIZE)
         
         # Configure MCP server parameters
         script_path = Path(__file__).parent / "mcp_server.py"
-        server_params = StdioServerParameters(
+        self._server_params = StdioServerParameters(
             command="python",
             args=[str(script_path)],
             env=None
         )
         
-        # Start server as a background task using stdio_client
-        self.server_task = asyncio.create_task(self._run_server(server_params))
+        # Start each server as a background task using stdio_client,
+        # with an event to notify its session initialization completion
+        ready_events = [asyncio.Event() for _ in range(MCP_POOL_SIZE)]
+        self.server_tasks = [
+            asyncio.create_task(self._run_server(ready))
+            for ready in ready_events
+        ]
         
-        # Wait until session is initialized
+        # Wait until all sessions are initialized
         try:
-            await asyncio.wait_for(self.session_ready.wait(), timeout=10.0)
-            logger.info("MCP server started successfully")
+            await asyncio.wait_for(
+                asyncio.gather(*(ready.wait() for ready in ready_events)),
+                timeout=10.0
+            )
+            logger.info("MCP servers started successfully")
         except asyncio.TimeoutError:
-            logger.error("MCP server failed to start within 10 seconds")
-            if self.server_task:
-                self.server_task.cancel()
+            logger.error("MCP servers failed to start within 10 seconds")
+            self._server_params = None
+            for task in self.server_tasks:
+                task.cancel()
             raise RuntimeError("Failed to start MCP server")
     
-    async def _run_server(self, server_params: StdioServerParameters):
-        """Establish communication with MCP server"""
-        try:
-            async with stdio_client(server_params) as (read, write):
-                async with ClientSession(read, write) as session:
-                    self.session = session
-                    await session.initialize()
-                    logger.info("MCP session initialized")
-                    
-                    # Notify session initialization completion
-                    self.session_ready.set()
-                    
-                    # Maintain session
-                    try:
-                        while True:
-                            await asyncio.sleep(1)
-                    except asyncio.CancelledError:
-                        logger.info("MCP session cancelled")
-                        raise
-        except Exception as e:
-            logger.error("Error in MCP server: %s", str(e), exc_info=True)
-            raise
+    async def _run_server(self, ready: asyncio.Event):
+        """Keep one MCP server running and its session in the pool, restarting it if it dies"""
+        while self._server_params is not None:
+            try:
+                async with stdio_client(self._server_params) as (read, write):
+                    async with ClientSession(read, write) as session:
+                        await session.initialize()
+                        stop = asyncio.Event()
+                        self._session_stops[session] = stop
+                        self._sessions.append(session)
+                        self._session_added.set()
+                        logger.info("MCP session initialized")
+                        
+                        # Notify session initialization completion
+                        ready.set()
+                        
+                        # Maintain session until shutdown or until its server is found dead
+                        try:
+                            await stop.wait()
+                        except asyncio.CancelledError:
+                            logger.info("MCP session cancelled")
+                            raise
+                        finally:
+                            self._drop_session(session)
+                            self._session_stops.pop(session, None)
+            except Exception as e:
+                logger.error("Error in MCP server: %s", str(e), exc_info=True)
+            
+            if self._server_params is not None:
+                logger.warning("MCP server exited, restarting")
+                # Avoid a tight restart loop if the server keeps failing
+                await asyncio.sleep(1.0)
     
     async def stop_mcp_server(self):
-        """Stop MCP server"""
+        """Stop all MCP servers"""
         logger.info("Stopping MCP server...")
-        if self.server_task:
-            self.server_task.cancel()
+        # Stop handing out sessions and restarting servers before they go away
+        self._server_params = None
+        self._sessions = []
+        for stop in self._session_stops.values():
+            stop.set()
+        for task in self.server_tasks:
+            task.cancel()
+        await asyncio.gather(*self.server_tasks, return_exceptions=True)
+        self.server_tasks = []
+        self._sessions = []
+        self._session_stops = {}
+        self._claude_tools = None
+        logger.info("MCP server stopped")
+    
+    async def _pick_session(self, route_key=None) -> ClientSession:
+        """Pick a live MCP session; sessions are shared, not held.
+        
+        Requests with a route_key always go to the same session while the pool
+        is unchanged, so repeated searches hit that server's result cache.
+        Others are spread round-robin.
+        """
+        if not self._sessions and self._server_params is not None:
+            logger.error("No live MCP sessions, waiting for a server to restart")
             try:
-                await self.server_task
-            except asyncio.CancelledError:
+                async with asyncio.timeout(10.0):
+                    while not self._sessions and self._server_params is not None:
+                        self._session_added.clear()
+                        await self._session_added.wait()
+            except TimeoutError:
                 pass
-        self.session = None
-        self.session_ready = None
-        logger.info("MCP server stopped")
+        if not self._sessions:
+            raise RuntimeError("No MCP session available")
+        
+        index = next(self._session_counter) if route_key is None else hash(route_key)
+        return self._sessions[index % len(self._sessions)]
+    
+    def _drop_session(self, session: ClientSession):
+        """Stop handing out a session and let its server task restart it"""
+        if session in self._sessions:
+            self._sessions.remove(session)
+        stop = self._session_stops.get(session)
+        if stop:
+            stop.set()
+    
+    async def _request(self, send, route_key=None):
+        """Send a request on a pooled session, moving to another session when
+        this one's server has gone away"""
+        # Each failed attempt drops one dead session, so after at most
+        # MCP_POOL_SIZE failures the request waits for a restarted server
+        attempts = MCP_POOL_SIZE + 1
+        for attempt in range(attempts):
+            session = await self._pick_session(route_key)
+            try:
+                return await send(session)
+            except (anyio.ClosedResourceError, anyio.BrokenResourceError, McpError) as e:
+                if isinstance(e, McpError) and e.error.code != CONNECTION_CLOSED:
+                    raise
+                if session in self._sessions:
+                    logger.warning("MCP session closed, dropping it from the pool")
+                    self._drop_session(session)
+                if attempt == attempts - 1:
+                    raise
+    
+    async def _execute_tool(self, tool_use) -> str:
+        """Execute a single tool call on the MCP server and return its text"""
+        logger.info("Executing MCP tool: %s", tool_use.name)
+        
+        # Request MCP server to execute tool; identical calls share a server
+        route_key = (tool_use.name, orjson.dumps(tool_use.input, option=orjson.OPT_SORT_KEYS))
+        mcp_result = await self._request(
+            lambda session: session.call_tool(tool_use.name, tool_use.input),
+            route_key
+        )
+        
+        # Get tool result
+        result_text = ""
+        for content in mcp_result.content:
+            if hasattr(content, 'text'):
+                result_text += content.text
+        
+        logger.info("MCP tool result: %s", result_text)
+        return result_text
     
     async def _run_agent_loop(self, messages: list, claude_tools: list) -> AsyncGenerator[dict, None]:
         """Claude agent loop: automatically handle tool calls"""
@@ -109,13 +269,29 @@ class MCPClient:
         for iteration in range(max_iterations):
             logger.info("Agent loop iteration %d", iteration + 1)
             
-            # Call Claude (synchronous method)
-            response = self.anthropic_client.messages.create(
+            # Stream Claude's response so text reaches the client as it is generated
+            async with self.anthropic_client.messages.stream(
                 model="claude-sonnet-4-5-20250929",
                 max_tokens=2048,
                 tools=claude_tools,
                 messages=messages
-            )
+            ) as stream:
+                async for event in stream:
+                    if event.type == "text":
+                        # Return text delta
+                        yield {
+                            "type": "text",
+                            "content": event.text
+                        }
+                    elif event.type == "content_block_stop" and event.content_block.type == "tool_use":
+                        # Tool input is complete once its block stops
+                        yield {
+                            "type": "tool_use",
+                            "tool_name": event.content_block.name,
+                            "tool_input": event.content_block.input
+                        }
+                
+                response = await stream.get_final_message()
             
             # Add response to message history
             assistant_content = []
@@ -123,21 +299,11 @@ class MCPClient:
             
             for content_block in response.content:
                 if content_block.type == "text":
-                    # Return text response
-                    yield {
-                        "type": "text",
-                        "content": content_block.text
-                    }
                     assistant_content.append(content_block)
                 elif content_block.type == "tool_use":
                     # Record tool use
                     tool_uses.append(content_block)
                     assistant_content.append(content_block)
-                    yield {
-                        "type": "tool_use",
-                        "tool_name": content_block.name,
-                        "tool_input": content_block.input
-                    }
             
             # Add assistant response to history
             messages.append({
@@ -150,25 +316,13 @@ class MCPClient:
                 logger.info("No tool use, agent loop complete")
                 break
             
-            # Execute tools on MCP server
+            # Execute tools on MCP server concurrently
+            results = await asyncio.gather(
+                *(self._execute_tool(tool_use) for tool_use in tool_uses)
+            )
+            
             tool_results = []
-            for tool_use in tool_uses:
-                logger.info("Executing MCP tool: %s", tool_use.name)
-                
-                # Request MCP server to execute tool
-                mcp_result = await self.session.call_tool(
-                    tool_use.name,
-                    tool_use.input
-                )
-                
-                # Get tool result
-                result_text = ""
-                for content in mcp_result.content:
-                    if hasattr(content, 'text'):
-                        result_text += content.text
-                
-                logger.info("MCP tool result: %s", result_text)
-                
+            for tool_use, result_text in zip(tool_uses, results):
                 tool_results.append({
                     "type": "tool_result",
                     "tool_use_id": tool_use.id,
@@ -192,94 +346,98 @@ class MCPClient:
         if iteration == max_iterations - 1:
             logger.warning("Agent loop reached max iterations")
     
-    async def explain_research_term_streaming(self, text: str) -> AsyncGenerator[str, None]:
+    async def _batch_text_events(self, events: AsyncGenerator[dict, None]) -> AsyncGenerator[dict, None]:
+        """Merge consecutive text deltas that arrive within TEXT_BATCH_WINDOW"""
+        queue = asyncio.Queue()
+        done = object()
+        
+        async def produce():
+            try:
+                async for event in events:
+                    await queue.put(event)
+            finally:
+                await queue.put(done)
+        
+        producer = asyncio.create_task(produce())
+        loop = asyncio.get_running_loop()
+        try:
+            pending = None
+            while True:
+                event = pending if pending is not None else await queue.get()
+                pending = None
+                if event is done:
+                    break
+                
+                if event["type"] == "text":
+                    # Keep collecting text until the window closes or another event type arrives
+                    chunks = [event["content"]]
+                    deadline = loop.time() + TEXT_BATCH_WINDOW
+                    while (remaining := deadline - loop.time()) > 0:
+                        try:
+                            next_event = await asyncio.wait_for(queue.get(), remaining)
+                        except asyncio.TimeoutError:
+                            break
+                        if next_event is not done and next_event["type"] == "text":
+                            chunks.append(next_event["content"])
+                        else:
+                            pending = next_event
+                            break
+                    event = {"type": "text", "content": "".join(chunks)}
+                
+                yield event
+            
+            # Re-raise any error from the agent loop
+            await producer
+        finally:
+            producer.cancel()
+    
+    async def explain_research_term_streaming(self, text: str) -> AsyncGenerator[bytes, None]:
         """Use MCP server to explain research terms and generate streaming response with Claude"""
         logger.info("Starting research term explanation for: %s", text[:50])
         
         try:
             # Check if MCP session is initialized
-            if not self.session:
-                yield f"data: {json.dumps({'type': 'error', 'content': 'MCP server not initialized'})}\n\n"
+            if self._server_params is None:
+                yield sse_event({'type': 'error', 'content': 'MCP server not initialized'})
                 return
             
-            # Get available tools from MCP server
-            logger.info("Fetching available tools from MCP server")
-            tools_result = await self.session.list_tools()
-            logger.info("Available tools: %s", [tool.name for tool in tools_result.tools])
-            
-            # Convert MCP tools to Claude API tool format
-            claude_tools = []
-            for tool in tools_result.tools:
-                claude_tools.append({
-                    "name": tool.name,
-                    "description": tool.description,
-                    "input_schema": tool.inputSchema
-                })
+            # Get available tools from MCP server (static for the server's lifetime)
+            if self._claude_tools is None:
+                logger.info("Fetching available tools from MCP server")
+                tools_result = await self._request(lambda session: session.list_tools())
+                logger.info("Available tools: %s", [tool.name for tool in tools_result.tools])
+                
+                # Convert MCP tools to Claude API tool format
+                self._claude_tools = [
+                    {
+                        "name": tool.name,
+                        "description": tool.description,
+                        "input_schema": tool.inputSchema
+                    }
+                    for tool in tools_result.tools
+                ]
+            claude_tools = self._claude_tools
             
             # Initial message
             messages = [
                 {
                     "role": "user",
-                    "content": f"""You are a research term explainer. Your task is to explain the term: '{text}'
-
-Follow these steps in order:
-
-Step 1: Search for relevant papers
-- If you know landmark/seminal papers for this term, search by exact title
-- Search using the original term '{text}' as a keyword
-- Search using related technical terms, variations, or more specific keywords
-- Use multiple search queries to gather approximately 20-30 papers total
-- Use max_results parameter appropriately for each search
-
-Step 2: Filter papers based on abstracts
-- Read the abstract of each retrieved paper carefully
-- Select only papers that are directly relevant to explaining '{text}'
-- Exclude papers that only mention the term tangentially
-- Aim to select the top 10 most relevant papers (or fewer if less than 10 are truly relevant)
-- Prioritize: foundational papers, seminal works, survey papers, and highly-cited research
-
-Step 3: Write the explanation
-- Based on the abstracts and content of the selected papers, write a comprehensive explanation of '{text}'
-- Include: definition, key concepts, applications, and significance in the field
-- Reference specific papers when explaining concepts (e.g., "as introduced in [Paper Title]")
-- Use proper Markdown format with double line breaks between sections
-
-Step 4: Display the selected papers
-- At the end, show the 10 most relevant papers
-- IMPORTANT: Use the ACTUAL pdf_url from each paper result
-- Format each paper link like this example:
-  - [Attention is All You Need](https://arxiv.org/pdf/1706.03762) - Introduces the Transformer architecture
-- Replace the title and URL with the actual values from the search results
-- Do NOT use placeholder text like "(arXiv URL)" - use the real PDF URL returned in the search results
-
-## Related Papers
-
-[List the actual papers here with their real PDF URLs]
-
-Format requirements:
-- Use proper Markdown with clear line breaks
-- Use double line breaks between sections
-- Important: In the explanation text (Step 3), you must insert a newline character (\n) after every sentence (ending in '.').
-- Make the explanation evidence-based using the paper abstracts
-- **Always use the actual PDF URLs from the search results, never placeholder text**
-
-Important: Your explanation should be grounded in the actual content of the papers you found, not just general knowledge.
-"""
-}
+                    "content": EXPLAIN_PROMPT_TEMPLATE.format(text=text)
+                }
             ]
             
             logger.info("Starting MCP-enabled agent loop")
             
             # Run agent loop (acting like an MCP client)
-            async for event in self._run_agent_loop(messages, claude_tools):
-                yield f"data: {json.dumps(event)}\n\n"
+            async for event in self._batch_text_events(self._run_agent_loop(messages, claude_tools)):
+                yield sse_event(event)
             
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            yield sse_event({'type': 'done'})
             logger.info("Research term explanation completed")
         
         except Exception as e:
             logger.error("Error in explain_research_term_streaming: %s", str(e), exc_info=True)
-            yield f"data: {json.dumps({'type': 'error', 'content': f'Error processing request: {str(e)}'})}\n\n"
+            yield sse_event({'type': 'error', 'content': f'Error processing request: {str(e)}'})
             
 mcp_client = MCPClient()
 
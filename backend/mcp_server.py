@@ -1,10 +1,126 @@
 import asyncio
+import re
+import xml.etree.ElementTree as ET
+import httpx
+from cachetools import TTLCache
 from mcp.server import Server
 from mcp.types import Tool, TextContent
 import mcp.server.stdio
-import arxiv
 mcp_server = Server("text-length-server")
 
+ARXIV_API_URL = "https://export.arxiv.org/api/query"
+ATOM_NS = {
+    "atom": "http://www.w3.org/2005/Atom",
+    "arxiv": "http://arxiv.org/schemas/atom",
+    "opensearch": "http://a9.com/-/spec/opensearch/1.1/",
+}
+
+# Retry transient arXiv failures: 3 retries on error statuses (as the arxiv
+# library did) and on empty pages for queries that report matches
+ARXIV_MAX_RETRIES = 3
+ARXIV_RETRY_BACKOFF = 1.0  # seconds, doubled after each retry
+ARXIV_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Shared HTTP client so searches reuse connections and never block the event loop
+_http_client: httpx.AsyncClient | None = None
+
+# Formatted search results keyed by (tool, whitespace-normalized query, max_results).
+# Case is kept because the cached text quotes the query as given
+_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+
+def _cache_key(tool_name: str, query: str, max_results: int) -> tuple:
+    return (tool_name, " ".join(query.split()), max_results)
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                # Retries failed connection attempts only; error responses are
+                # retried by _search_arxiv
+                retries=2,
+                # Keep connections to export.arxiv.org alive across concurrent tool calls
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10)
+            ),
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            follow_redirects=True
+        )
+    return _http_client
+
+def _parse_entry(entry: ET.Element) -> dict:
+    """Convert an Atom <entry> from the arXiv API into a paper dict"""
+    summary = entry.findtext("atom:summary", "", ATOM_NS).strip()
+    pdf_url = None
+    for link in entry.findall("atom:link", ATOM_NS):
+        if link.get("title") == "pdf":
+            pdf_url = link.get("href")
+    primary = entry.find("arxiv:primary_category", ATOM_NS)
+    authors = entry.findall("atom:author", ATOM_NS)
+    return {
+        'title': re.sub(r"\s+", " ", entry.findtext("atom:title", "", ATOM_NS)).strip(),
+        # Only the first three names are ever displayed
+        'authors_head': [author.findtext("atom:name", "", ATOM_NS) for author in authors[:3]],
+        'author_count': len(authors),
+        'summary': summary[:300] + "..." if len(summary) > 300 else summary,
+        'published': entry.findtext("atom:published", "", ATOM_NS)[:10],
+        'pdf_url': pdf_url,
+        'entry_id': entry.findtext("atom:id", "", ATOM_NS),
+        'categories': [category.get("term") for category in entry.findall("atom:category", ATOM_NS)],
+        'primary_category': primary.get("term") if primary is not None else None
+    }
+
+class _EmptyPageError(Exception):
+    """arXiv reported matches but returned a page without entries"""
+
+def _parse_feed(content: bytes) -> list[dict]:
+    """Parse an arXiv API Atom feed into paper dicts"""
+    feed = ET.fromstring(content)
+    entries = feed.findall("atom:entry", ATOM_NS)
+    # Malformed queries come back as a single entry pointing at the API error docs
+    if len(entries) == 1 and "/api/errors" in entries[0].findtext("atom:id", "", ATOM_NS):
+        raise ValueError(f"arXiv API error: {entries[0].findtext('atom:summary', '', ATOM_NS).strip()}")
+    # The API intermittently returns empty pages for queries that have results
+    if not entries and int(feed.findtext("opensearch:totalResults", "0", ATOM_NS) or 0) > 0:
+        raise _EmptyPageError("arXiv returned an empty page for a query that reports matches")
+    return [_parse_entry(entry) for entry in entries]
+
+def _retry_after_seconds(response: httpx.Response) -> float | None:
+    """Read a Retry-After header given in seconds, capped to keep tool calls responsive"""
+    try:
+        return min(float(response.headers["Retry-After"]), 10.0)
+    except (KeyError, ValueError):
+        return None
+
+async def _search_arxiv(query: str, max_results: int) -> list[dict]:
+    """Query the arXiv Atom API and return matching papers sorted by relevance"""
+    params = {
+        "search_query": query,
+        "max_results": max_results,
+        "sortBy": "relevance",
+        "sortOrder": "descending"
+    }
+    retry_after = None
+    for attempt in range(ARXIV_MAX_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(retry_after or ARXIV_RETRY_BACKOFF * 2 ** (attempt - 1))
+        # A Retry-After only applies to the retry of the response that sent it
+        retry_after = None
+        last_attempt = attempt == ARXIV_MAX_RETRIES
+        
+        response = await _get_http_client().get(ARXIV_API_URL, params=params)
+        if response.status_code in ARXIV_RETRY_STATUSES and not last_attempt:
+            # Honor the server's requested delay when rate limited
+            retry_after = _retry_after_seconds(response)
+            continue
+        response.raise_for_status()
+        
+        try:
+            return _parse_feed(response.content)
+        except _EmptyPageError:
+            # Surface as a tool error rather than an empty (and cached) result
+            if last_attempt:
+                raise
+
 @mcp_server.list_tools()
 async def list_tools() -> list[Tool]:
     return [
@@ -103,44 +219,31 @@ async def call_tool(tool_name: str, arguments: dict) -> list[TextContent]:
                 text="Error: At least one search parameter is required."
             )]
         
+        key = _cache_key(tool_name, query, max_results)
+        cached = _CACHE.get(key)
+        if cached is not None:
+            return [TextContent(type="text", text=cached)]
+        
         # Execute search
-        search = arxiv.Search(
-            query=query,
-            max_results=max_results,
-            sort_by=arxiv.SortCriterion.Relevance,
-            sort_order=arxiv.SortOrder.Descending
-        )
-        client = arxiv.Client()
-        papers = []
-        
-        for result in client.results(search):
-            paper_info = {
-                'title': result.title,
-                'authors': [author.name for author in result.authors],
-                'summary': result.summary[:300] + "..." if len(result.summary) > 300 else result.summary,
-                'published': result.published.strftime("%Y-%m-%d"),
-                'pdf_url': result.pdf_url,
-                'entry_id': result.entry_id,
-                'categories': result.categories,
-                'primary_category': result.primary_category
-            }
-            papers.append(paper_info)
+        papers = await _search_arxiv(query, max_results)
         
         # Format results
         if not papers:
             result_text = f"No papers found for query: {query}"
         else:
-            result_text = f"Found {len(papers)} papers:\n\n"
+            parts = [f"Found {len(papers)} papers:\n\n"]
             for i, paper in enumerate(papers, 1):
-                result_text += f"{i}. {paper['title']}\n"
-                result_text += f"   Authors: {', '.join(paper['authors'][:3])}"
-                if len(paper['authors']) > 3:
-                    result_text += f" et al. ({len(paper['authors'])} total)"
-                result_text += f"\n   Published: {paper['published']}\n"
-                result_text += f"   Categories: {', '.join(paper['categories'])}\n"
-                result_text += f"   PDF: {paper['pdf_url']}\n"
-                result_text += f"   Summary: {paper['summary']}\n\n"
+                parts.append(f"{i}. {paper['title']}\n")
+                parts.append(f"   Authors: {', '.join(paper['authors_head'])}")
+                if paper['author_count'] > 3:
+                    parts.append(f" et al. ({paper['author_count']} total)")
+                parts.append(f"\n   Published: {paper['published']}\n")
+                parts.append(f"   Categories: {', '.join(paper['categories'])}\n")
+                parts.append(f"   PDF: {paper['pdf_url']}\n")
+                parts.append(f"   Summary: {paper['summary']}\n\n")
+            result_text = "".join(parts)
         
+        _CACHE[key] = result_text
         return [TextContent(type="text", text=result_text)]
     elif tool_name == "search_with_multiple_keywords":
         keywords = arguments.get("keywords", [])
@@ -162,42 +265,30 @@ async def call_tool(tool_name: str, arguments: dict) -> list[TextContent]:
         
         query = " AND ".join(query_parts)
         
-        # Execute search
-        search = arxiv.Search(
-            query=query,
-            max_results=max_results,
-            sort_by=arxiv.SortCriterion.Relevance,
-            sort_order=arxiv.SortOrder.Descending
-        )
+        key = _cache_key(tool_name, query, max_results)
+        cached = _CACHE.get(key)
+        if cached is not None:
+            return [TextContent(type="text", text=cached)]
         
-        client = arxiv.Client()
-        papers = []
-        for result in client.results(search):
-            paper_info = {
-                'title': result.title,
-                'authors': [author.name for author in result.authors],
-                'summary': result.summary[:300] + "..." if len(result.summary) > 300 else result.summary,
-                'published': result.published.strftime("%Y-%m-%d"),
-                'pdf_url': result.pdf_url,
-                'entry_id': result.entry_id,
-                'categories': result.categories
-            }
-            papers.append(paper_info)
+        # Execute search
+        papers = await _search_arxiv(query, max_results)
         
         # Format results
         if not papers:
             result_text = f"No papers found containing all keywords: {', '.join(keywords)}"
         else:
-            result_text = f"Found {len(papers)} papers containing all keywords ({', '.join(keywords)}):\n\n"
+            parts = [f"Found {len(papers)} papers containing all keywords ({', '.join(keywords)}):\n\n"]
             for i, paper in enumerate(papers, 1):
-                result_text += f"{i}. {paper['title']}\n"
-                result_text += f"   Authors: {', '.join(paper['authors'][:3])}"
-                if len(paper['authors']) > 3:
-                    result_text += f" et al."
-                result_text += f"\n   Published: {paper['published']}\n"
-                result_text += f"   PDF: {paper['pdf_url']}\n"
-                result_text += f"   Summary: {paper['summary']}\n\n"
+                parts.append(f"{i}. {paper['title']}\n")
+                parts.append(f"   Authors: {', '.join(paper['authors_head'])}")
+                if paper['author_count'] > 3:
+                    parts.append(" et al.")
+                parts.append(f"\n   Published: {paper['published']}\n")
+                parts.append(f"   PDF: {paper['pdf_url']}\n")
+                parts.append(f"   Summary: {paper['summary']}\n\n")
+            result_text = "".join(parts)
         
+        _CACHE[key] = result_text
         return [TextContent(type="text", text=result_text)]
     else:
         raise ValueError(f"Unknown tool: {tool_name}")
@@ -209,6 +300,8 @@ async def run_mcp_server():
             write_stream,
             mcp_server.create_initialization_options()
         )
+    if _http_client is not None:
+        await _http_client.aclose()
 
 if __name__ == "__main__":
     asyncio.run(run_mcp_server())
\ No newline at end of file